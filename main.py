@@ -1,8 +1,12 @@
 import os
 import asyncio
 
+from loguru import logger
+
 from utils.logServer import logServer
 
+from utils.Create_model_client import close_shared_clients
+
 from servers.ModelServer import run_xinference_test
 from servers.PlaywrightServer import PlaywrightServer
 
@@ -19,7 +23,7 @@ class main():
 
     async def main(self):
         """
-        主异步函数，使用 asyncio.create_task启动并等待所有测试任务。
+        主异步函数，使用 asyncio.create_task启动所有测试任务，并通过 asyncio.gather 并发等待。
         """
         # 使用 asyncio.create_task 将协程包装成任务并立即开始调度
         ai_client_task = asyncio.create_task(run_xinference_test(
@@ -29,10 +33,20 @@ class main():
             prompt_file_path=self.PROMPT_FILE_PATH,
         ))
         playwright_task = asyncio.create_task(PlaywrightServer().run())
-        await ai_client_task
-        await playwright_task
+        # 并发等待所有任务，单个任务出错不会影响另一个任务的结果
+        results = await asyncio.gather(ai_client_task, playwright_task, return_exceptions=True)
+        await close_shared_clients()
+        for task_name, result in zip(("Xinference", "Playwright"), results):
+            if isinstance(result, BaseException):
+                logger.opt(exception=result).error("{}任务异常", task_name)
 
 if __name__ == '__main__':
+    # 优先使用 uvloop 作为事件循环(Windows 不支持，未安装时回退到默认事件循环)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        logger.debug("未安装 uvloop，使用默认事件循环")
     # 运行主异步函数
     app = main()
     asyncio.run(app.main())
\ No newline at end of file
@@ -1,32 +1,64 @@
 import asyncio
 
 from loguru import logger
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
 
 from utils.PlayWright_Helper import PlaywrightHelper
 
 class PlaywrightServer:
     """模拟Playwright操作"""
 
-    def __init__(self) -> None:
+    def __init__(self, concurrency: int = 4) -> None:
+        """
+        :param concurrency: 并发操作的标签页数量，默认为 4
+        """
         self.page = None
+        self.concurrency = max(1, concurrency)
+
+    async def _search_worker(self, page: Page, numbers: list[int]) -> None:
+        """
+        在单个标签页中依次输入分配到的数字并搜索
+        :param page: 该工作协程独占的页面对象
+        :param numbers: 分配给该页面的输入数字
+        """
+        await page.goto("https://www.baidu.com")
+        # 循环外创建一次定位器，使用 CSS 选择器代替 XPath
+        search_input = page.locator('input#kw')
+
+        for i in numbers:
+            # 使用 loguru 的延迟格式化，日志级别被屏蔽时不会构造字符串
+            logger.info("Playwright正在输入{}", i)
+            await search_input.fill(f"{i}")
+
+            await page.keyboard.press('Enter')
+
+            # 等待本次搜索的结果页加载完成(百度会将标题设置为"<关键词>_百度搜索")，而不是固定等待 3 秒
+            try:
+                await page.wait_for_function(
+                    "q => document.title.startsWith(q + '_')", arg=f"{i}", timeout=3000
+                )
+            except PlaywrightTimeoutError:
+                logger.warning("Playwright等待第{}次搜索结果超时", i)
+                await page.wait_for_timeout(500)
 
     async def run(self):
         try:
-            
+
             logger.info("开始模拟Playwright操作")
             self.playwright_helper = PlaywrightHelper()
 
             self.page = await self.playwright_helper.start()
 
-            await self.page.goto("https://www.baidu.com")
-
-            for i in range(1,100):
-                logger.info(f"Playwright正在输入{i}")
-                await self.page.locator('//input[@id="kw"]').fill(f"{i}")
-
-                await self.page.keyboard.press('Enter')
+            # 将输入任务均分到多个标签页，并发执行
+            numbers = list(range(1, 100))
+            chunks = [numbers[k::self.concurrency] for k in range(self.concurrency)]
+            pages = [self.page]
+            for _ in chunks[1:]:
+                pages.append(await self.playwright_helper.context.new_page())
 
-                await self.page.wait_for_timeout(3000) 
+            await asyncio.gather(*(
+                self._search_worker(page, chunk) for page, chunk in zip(pages, chunks)
+            ))
 
             await self.page.pause()
 
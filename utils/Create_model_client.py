@@ -1,28 +1,149 @@
-import json
+import os
+import sys
+import mmap
+import functools
+from pathlib import Path
 
 import openai
+import orjson
 from loguru import logger
 
 from utils.logServer import logServer
 
+# 流式输出每累积多少个数据块写一次标准输出
+STDOUT_FLUSH_CHUNKS = 16
+# 超过该大小的提示词文件使用 mmap 读取
+PROMPT_MMAP_THRESHOLD = 256 * 1024
+
+
+@functools.lru_cache(maxsize=8)
+def _load_prompt(path: str) -> str:
+    """
+    读取提示词文件，按路径缓存，多个客户端实例共享同一份内容。
+    :param path: 提示词文件的路径。
+    :return: 文件内容字符串。
+    """
+    if os.path.getsize(path) > PROMPT_MMAP_THRESHOLD:
+        # 大文件通过 mmap 直接映射页缓存，省去缓冲 IO 的中间拷贝
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8')
+    return Path(path).read_text(encoding='utf-8')
+
+
+# 按 (base_url, api_key) 共享的异步客户端，复用底层 httpx 连接池
+_clients: dict[tuple[str, str], openai.AsyncOpenAI] = {}
+
+
+async def close_shared_clients() -> None:
+    """
+    关闭所有共享的异步 OpenAI 客户端，需在事件循环结束前调用。
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
+
+
+class _ThinkTagStreamParser:
+    """
+    边接收流式数据边解析 <think> 标签的状态机，按所处位置将内容分流到思考过程或最终答案。
+    状态依次为 pre_think -> in_think -> post_think。
+    """
+    _START_TAG = "<think>"
+    _END_TAG = "</think>"
+
+    def __init__(self) -> None:
+        self.state = "pre_think"
+        self.pre_parts = []
+        self.thinking_parts = []
+        self.final_parts = []
+        # 暂存可能是标签前缀的尾部字符，处理标签被拆分到多个数据块的情况
+        self.tag_buf = ""
+
+    def _current(self) -> tuple[list, str | None]:
+        """
+        :return: 当前状态对应的 (内容列表, 待匹配的下一个标签)。
+        """
+        if self.state == "pre_think":
+            return self.pre_parts, self._START_TAG
+        if self.state == "in_think":
+            return self.thinking_parts, self._END_TAG
+        return self.final_parts, None
+
+    def feed(self, text: str) -> None:
+        """
+        接收一个内容增量并按当前状态分流。
+        :param text: 流式返回的内容增量。
+        """
+        data = self.tag_buf + text
+        self.tag_buf = ""
+        while data:
+            parts, tag = self._current()
+            if tag is None:
+                parts.append(data)
+                return
+            index = data.find(tag)
+            if index != -1:
+                parts.append(data[:index])
+                data = data[index + len(tag):]
+                self.state = "in_think" if self.state == "pre_think" else "post_think"
+                continue
+            # 末尾若是标签的前缀，则留到下一个数据块再判断
+            keep = 0
+            for size in range(min(len(tag) - 1, len(data)), 0, -1):
+                if tag.startswith(data[-size:]):
+                    keep = size
+                    break
+            parts.append(data[:len(data) - keep])
+            self.tag_buf = data[len(data) - keep:]
+            return
+
+    def result(self) -> tuple[str, str]:
+        """
+        流结束后输出解析结果。
+        :return: 一个包含 (思考过程, 最终JSON字符串) 的元组。
+        """
+        parts, _ = self._current()
+        parts.append(self.tag_buf)
+        self.tag_buf = ""
+        if self.state == "post_think":
+            return "".join(self.thinking_parts).strip(), "".join(self.final_parts).strip()
+        # 标签不完整时，与原逻辑一致，将全部内容视为最终答案
+        content = "".join(self.pre_parts)
+        if self.state == "in_think":
+            content += self._START_TAG + "".join(self.thinking_parts)
+        return "未找到思考过程。", content.strip()
+
+
 class AsyncAnamnesisModelClient:
     """
     一个用于与部署在Xinference或官方API上的既往病史判别模型进行异步交互的客户端类。
     """
-    def __init__(self, model_uid: str, base_url: str, api_key: str, prompt_file_path: str):
+    # 后端不支持 chat_template_kwargs 时，关闭思考模式需在用户输入开头加入的指令
+    NO_THINK_PREFIX = "/no_think\n"
+
+    def __init__(self, model_uid: str, base_url: str, api_key: str, prompt_file_path: str, verbose: bool = False, max_tokens: int = 4096,
+                 use_chat_template_kwargs: bool = False):
         """
         初始化客户端。
         :param model_uid: Xinference或云服务商处指定的模型 ID。
         :param base_url: 服务的基础 URL。
         :param api_key: API 密钥。
         :param prompt_file_path: 系统提示词文件的路径。
+        :param verbose: 是否将流式返回的内容实时打印到标准输出，默认为 False。
+        :param max_tokens: 单次请求允许生成的最大 token 数，默认为 4096。
+        :param use_chat_template_kwargs: 后端是否支持通过 chat_template_kwargs 开关思考模式(如 vLLM)，
+                                         默认为 False，此时使用 /no_think 指令。
         """
         self.model_uid = model_uid
         self.base_url = base_url
         self.api_key = api_key
         self.prompt_file_path = prompt_file_path
+        self.verbose = verbose
+        self.max_tokens = max_tokens
+        self.use_chat_template_kwargs = use_chat_template_kwargs
         
-        self.system_prompt_template = self._load_system_prompt()
+        self.system_prompt_template = sys.intern(self._load_system_prompt())
         # 初始化异步客户端
         self.async_client = self._initialize_openai_async_client()
 
@@ -33,21 +154,24 @@ class AsyncAnamnesisModelClient:
         """
         logger.info(f"加载系统提示词 '{self.prompt_file_path}' ")
         try:
-            with open(self.prompt_file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return _load_prompt(self.prompt_file_path)
         except FileNotFoundError:
             logger.error(f"系统提示词文件未找到: {self.prompt_file_path}")
             exit()
 
     def _initialize_openai_async_client(self) -> openai.AsyncOpenAI:
         """
-        初始化并返回配置好的异步 OpenAI 客户端。
+        获取配置好的异步 OpenAI 客户端，相同服务地址和密钥的实例共享同一个客户端。
         :return: openai.AsyncOpenAI 客户端实例。
         """
-        return openai.AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-        )
+        key = (self.base_url, self.api_key)
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+            )
+        return client
 
     def _prepare_messages(self, user_input: str, enable_thinking: bool) -> list:
         """
@@ -56,79 +180,101 @@ class AsyncAnamnesisModelClient:
         :param enable_thinking: 是否启用模型的思考模式。
         :return: 一个符合 OpenAI API 格式的消息列表。
         """
-        system_content = self.system_prompt_template
         final_user_input = user_input
-        if not enable_thinking:
-            # 如果不启用思考模式，在用户输入开头加入/no_think指令
-            final_user_input = "/no_think\n" + user_input
-        
+        if not enable_thinking and not self.use_chat_template_kwargs:
+            # 后端不支持结构化参数时，在用户输入开头加入/no_think指令
+            final_user_input = f"{self.NO_THINK_PREFIX}{user_input}"
+
         return [
-            {"role": "system", "content": system_content},
+            {"role": "system", "content": self.system_prompt_template},
             {"role": "user", "content": final_user_input}
         ]
 
-    async def _stream_and_process_response_async(self, messages: list) -> tuple[str, str]:
+    @staticmethod
+    def _flush_stdout(buf: bytearray) -> None:
+        """
+        将缓冲区内容一次性写入标准输出并清空缓冲区。
+        :param buf: 待写出的字节缓冲区。
+        """
+        sys.stdout.buffer.write(bytes(buf))
+        sys.stdout.buffer.flush()
+        buf.clear()
+
+    async def _stream_and_process_response_async(self, messages: list, enable_thinking: bool) -> tuple[str, str]:
         """
         发起流式请求,解析两种不同API格式的响应。
         :param messages: 准备好的消息列表。
+        :param enable_thinking: 是否启用模型的思考模式。
         :return: 一个包含 (思考过程, 最终JSON字符串) 的元组。
         """
+        extra_body = None
+        if self.use_chat_template_kwargs:
+            # 通过聊天模板参数开关思考模式，用户输入保持不变
+            extra_body = {"chat_template_kwargs": {"enable_thinking": enable_thinking}}
+
         stream = await self.async_client.chat.completions.create(
             model=self.model_uid,
             messages=messages,
-            max_tokens=4096,
+            max_tokens=self.max_tokens,
             temperature=0.1,
             top_p=0.1,
             stream=True,
+            extra_body=extra_body,
         )
 
-        full_response_content = ""
-        thinking_process = ""
-        final_answer = ""
+        think_parser = _ThinkTagStreamParser()
+        # 使用列表收集增量，结束后统一 join，避免字符串反复拼接
+        thinking_parts = []
+        final_parts = []
         is_official_api = False
+        # 流式输出缓冲区，攒够若干数据块再统一写入，减少 write() 系统调用
+        stdout_buf = bytearray()
+        chunk_count = 0
 
-        logger.debug("流式输出\n")
-        # 异步迭代并打印数据流
+        verbose = self.verbose
+        if verbose:
+            logger.debug("流式输出\n")
+        # 异步迭代数据流，verbose 开启时同时打印
         async for chunk in stream:
             delta = chunk.choices[0].delta
             
             # 智能适配：检查是否存在官方API特有的 'reasoning_content' 字段
-            if hasattr(delta, "reasoning_content") and delta.reasoning_content is not None:
+            reasoning_delta = getattr(delta, "reasoning_content", None)
+            if reasoning_delta is not None:
                 is_official_api = True
-                print(delta.reasoning_content, end="", flush=True)
-                thinking_process += delta.reasoning_content
+                if verbose:
+                    stdout_buf += reasoning_delta.encode('utf-8')
+                thinking_parts.append(reasoning_delta)
             
             # 处理标准的内容字段
             content_delta = delta.content
             if content_delta is not None:
                 if not is_official_api:
-                    # 如果不是官方API，则所有内容先统一接收
-                    full_response_content += content_delta
+                    # 如果不是官方API，则边接收边按 <think> 标签分流
+                    think_parser.feed(content_delta)
                 else:
                     # 如果是官方API，则这部分就是最终答案
-                    final_answer += content_delta
-                print(content_delta, end="", flush=True)
+                    final_parts.append(content_delta)
+                if verbose:
+                    stdout_buf += content_delta.encode('utf-8')
+
+            if verbose:
+                chunk_count += 1
+                if chunk_count % STDOUT_FLUSH_CHUNKS == 0 and stdout_buf:
+                    self._flush_stdout(stdout_buf)
 
-        print("\n")
+        if verbose:
+            stdout_buf += b"\n\n"
+            self._flush_stdout(stdout_buf)
 
         # 根据API类型进行最终解析
         if is_official_api:
+            thinking_process = "".join(thinking_parts)
+            final_answer = "".join(final_parts)
             return thinking_process if thinking_process else "未找到思考过程。", final_answer
         else:
-            # 沿用原有的 <think> 标签解析逻辑，处理 Xinference 的响应
-            if "<think>" in full_response_content and "</think>" in full_response_content:
-                start_tag = "<think>"
-                end_tag = "</think>"
-                start_index = full_response_content.find(start_tag)
-                end_index = full_response_content.find(end_tag)
-
-                if start_index != -1 and end_index != -1 and start_index < end_index:
-                    thinking_process = full_response_content[start_index + len(start_tag):end_index].strip()
-                    final_json_str = full_response_content[end_index + len(end_tag):].strip()
-                    return thinking_process, final_json_str
-            
-            return "未找到思考过程。", full_response_content.strip()
-
+            # Xinference 的响应已在接收过程中按 <think> 标签完成解析
+            return think_parser.result()
 
     async def run(self, user_input: str, enable_thinking: bool = True):
         """
@@ -139,18 +285,17 @@ class AsyncAnamnesisModelClient:
         """
         try:
             messages = self._prepare_messages(user_input, enable_thinking)
-            thinking_process, final_json_str = await self._stream_and_process_response_async(messages)
+            thinking_process, final_json_str = await self._stream_and_process_response_async(messages, enable_thinking)
             
             if thinking_process != "未找到思考过程." and len(thinking_process) > 0:
-                logger.info(f"模型思考过程:\n{thinking_process}\n")
+                logger.info("模型思考过程:\n{}\n", thinking_process)
             
-            parsed_json_obj = json.loads(final_json_str)
-            pretty_json_output = json.dumps(
-                parsed_json_obj, 
-                ensure_ascii=False,
-                indent=2
+            parsed_json_obj = orjson.loads(final_json_str)
+            # 美化后的 JSON 仅用于日志，借助 lazy 在日志级别被屏蔽时跳过序列化
+            logger.opt(lazy=True).info(
+                "模型最终输出:\n{}\n",
+                lambda: orjson.dumps(parsed_json_obj, option=orjson.OPT_INDENT_2).decode('utf-8')
             )
-            logger.info(f"模型最终输出:\n{pretty_json_output}\n")
 
             return final_json_str
 
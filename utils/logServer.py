@@ -60,12 +60,21 @@ class logServer: # 根据您提供的代码，类名是 logServer
         logger.level("ERROR", color="<red>")
         logger.level("CRITICAL", color="<bold><red><bg white>")
 
+        # WARNING 及以上级别使用带代码位置的完整格式，DEBUG/INFO 使用精简格式，
+        # 减少高频日志的格式化开销
+        warning_no = logger.level("WARNING").no
+
         file_format = (
             "{time:YYYY-MM-DD HH:mm:ss} - "
             "{level: <8} - "
             "[{file.name}-{line}] - "
             "[{function}] - "
-            "{message}"
+            "{message}\n{exception}"
+        )
+        file_terse_format = (
+            "{time:YYYY-MM-DD HH:mm:ss} - "
+            "{level: <8} - "
+            "{message}\n{exception}"
         )
 
         console_format = (
@@ -76,21 +85,30 @@ class logServer: # 根据您提供的代码，类名是 logServer
             "[{file.name}-{line}] - "
             "[{function}] - "
             "</level>"
-            "{message}"
+            "{message}\n{exception}"
+        )
+        console_terse_format = (
+            "\n"
+            "<level>"
+            "{time:YYYY-MM-DD HH:mm:ss} - "
+            "{level: <4} - "
+            "</level>"
+            "{message}\n{exception}"
         )
 
+        # 不使用 enqueue：单进程场景下直接写文件即可(依赖系统页缓存)，
+        # 避免每条日志经多进程队列序列化带来的开销
         self._file_handler_id = logger.add(
             sink=self.filename,
             level=file_log_level.upper(),
-            format=file_format,
-            encoding='utf-8',
-            enqueue=True
+            format=lambda record: file_format if record["level"].no >= warning_no else file_terse_format,
+            encoding='utf-8'
         )
 
         self._console_handler_id = logger.add(
             sink=sys.stderr,
             level=console_log_level.upper(),
-            format=console_format,
+            format=lambda record: console_format if record["level"].no >= warning_no else console_terse_format,
             colorize=True
         )
 